@@ -29,22 +29,25 @@ except ImportError:
     from urllib import urlencode
 
 try:
+    from typing import TYPE_CHECKING
     from typing import Any
+    from typing import Callable
     from typing import Dict
     from typing import List
     from typing import Optional
     from typing import Union
 except ImportError:
-    pass
+    TYPE_CHECKING = False
 
 from requests import Session
 from requests.adapters import HTTPAdapter
 from requests.exceptions import RequestException
 from urllib3.util import Retry
 
+from .exceptions import AlloCineException
 
-class AlloCineException(Exception):
-    pass
+if TYPE_CHECKING:
+    from .cache import ResponseCache
 
 
 class AlloCine:
@@ -66,9 +69,10 @@ class AlloCine:
     _REQUESTS_RETRIES = 10
     _REQUESTS_BACKOFF_FACTOR = 5
 
-    def __init__(self):
-        # type: () -> None
+    def __init__(self, cache=None):
+        # type: (Optional[ResponseCache]) -> None
 
+        self._cache = cache
         self._session = Session()
 
         retry_strategy = Retry(
@@ -87,6 +91,21 @@ class AlloCine:
         if self._session:
             self._session.close()
 
+    def _cached(self, namespace, key, fetch):
+        # type: (str, str, Callable[[], Any]) -> Any
+
+        if self._cache is None:
+            return fetch()
+
+        value = self._cache.get(namespace, key)
+        if value is None:
+            value = fetch()
+            # Do not cache missing data, which may be added later
+            if value:
+                self._cache.set(namespace, key, value)
+
+        return value
+
     def _query_allocine_api(self, path, payload):
         # type: (str, OrderedDict[str, Any])-> Dict[str, Any]
 
@@ -123,10 +142,12 @@ class AlloCine:
         payload["partner"] = self._ALLOCINE_PARTNER_KEY
         payload["q"] = title
 
-        return (
-            self._query_allocine_api("search", payload)
+        return self._cached(
+            "titles",
+            " ".join(title.lower().split()),
+            lambda: self._query_allocine_api("search", payload)
             .get("feed", {})
-            .get("movie", {})
+            .get("movie", {}),
         )
 
     def get_movie(self, movie_id):
@@ -139,7 +160,13 @@ class AlloCine:
         payload["profile"] = "large"
         payload["striptags"] = "synopsis,synopsisshort"
 
-        return self._query_allocine_api("movie", payload).get("movie", {})
+        return self._cached(
+            "responses",
+            "allocine/movie/{}".format(movie_id),
+            lambda: self._query_allocine_api("movie", payload).get(
+                "movie", {}
+            ),
+        )
 
     def get_media(self, media_id):
         # type: (int) -> Dict[str, Any]
@@ -150,11 +177,26 @@ class AlloCine:
         payload["partner"] = self._ALLOCINE_PARTNER_KEY
         payload["profile"] = "large"
 
-        return self._query_allocine_api("media", payload).get("media", {})
+        return self._cached(
+            "responses",
+            "allocine/media/{}".format(media_id),
+            lambda: self._query_allocine_api("media", payload).get(
+                "media", {}
+            ),
+        )
 
     def _get_imdb_id(self, movie_id):
         # type: (int) -> Optional[str]
 
+        return self._cached(
+            "ids",
+            "allocine-imdb/{}".format(movie_id),
+            lambda: self._query_imdb_id(movie_id),
+        )
+
+    def _query_imdb_id(self, movie_id):
+        # type: (int) -> Optional[str]
+
         # Use Wikidata to get the IMDB ID from the Allociné movie ID
         sparql_query = (
             'SELECT DISTINCT ?imdb WHERE {{ ?item wdt:P1265 "{}"; '
@@ -203,6 +245,15 @@ class AlloCine:
         if not imdb_movie_id:
             return None
 
+        return self._cached(
+            "ids",
+            "imdb-tmdb/{}".format(imdb_movie_id),
+            lambda: self._query_tmdb_id(imdb_movie_id),
+        )
+
+    def _query_tmdb_id(self, imdb_movie_id):
+        # type: (str) -> Optional[int]
+
         result = self._query_tmdb_api(
             "find/" + imdb_movie_id, params={"external_source": "imdb_id"},
         ).get("movie_results")
@@ -217,6 +268,15 @@ class AlloCine:
         if not tmdb_movie_id:
             return {}
 
+        return self._cached(
+            "responses",
+            "tmdb/movie/{}".format(tmdb_movie_id),
+            lambda: self._query_tmdb_movie(tmdb_movie_id),
+        )
+
+    def _query_tmdb_movie(self, tmdb_movie_id):
+        # type: (int) -> Dict[str, Any]
+
         movie_data = self._query_tmdb_api(
             "movie/{}".format(tmdb_movie_id),
             params={
@@ -0,0 +1,526 @@
+# coding: utf-8
+# Copyright © 2020 melmorabity
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+# Persistent cache of the data downloaded from AlloCiné, Wikidata and TMDB.
+#
+# Caches are SQLite databases holding, per namespace, timestamped entries
+# with zlib-compressed JSON values, so that a lookup or a save only touches
+# the entries it needs. The same versioned format is used for the cache of
+# each client and for the snapshots shared between clients: a snapshot
+# exported from a warm client can seed the others, opened read-only and
+# memory-mapped.
+#
+# Concurrent writers are serialized by SQLite for the duration of a
+# transaction only. Entries are merged one by one, the most recent ones
+# winning, and imports are split into small transactions, so running scrapes
+# are never locked out. Expired entries are pruned at most once a day.
+#
+# Kodi may reuse the interpreter between invocations (reuselanguageinvoker),
+# but each invocation still opens the databases again: this only costs a few
+# milliseconds, and entries written by other clients are always seen.
+
+import errno
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+
+try:
+    from urllib.request import pathname2url
+except ImportError:
+    from urllib import pathname2url
+
+try:
+    from typing import Any
+    from typing import Dict
+    from typing import Iterable
+    from typing import Iterator
+    from typing import Optional
+    from typing import Tuple
+
+    Row = Tuple[str, str, int, Any]
+except ImportError:
+    pass
+
+from .exceptions import CacheException
+from .exceptions import InvalidCacheException
+
+
+SNAPSHOT_FORMAT = "metadata.allocine.fr.python/cache"
+SNAPSHOT_VERSION = 2
+
+# Namespaces and time to live of their entries, in seconds
+NAMESPACES = {
+    # AlloCiné and TMDB movie data, AlloCiné media
+    "responses": 7 * 24 * 3600,
+    # AlloCiné to IMDB ID and IMDB to TMDB ID mappings
+    "ids": 30 * 24 * 3600,
+    # AlloCiné search results, by normalized title
+    "titles": 24 * 3600,
+}
+
+# How long to wait for a concurrent writer, in seconds
+BUSY_TIMEOUT = 10
+# Entries merged per transaction
+MERGE_BATCH_SIZE = 500
+# Memory-mapped size of read-only snapshots, in bytes
+MMAP_SIZE = 256 * 1024 * 1024
+# Minimum delay between two prunings of expired entries, in seconds
+PRUNE_INTERVAL = 24 * 3600
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS meta "
+    "(name TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS entries "
+    "(namespace TEXT NOT NULL, key TEXT NOT NULL, "
+    "timestamp INTEGER NOT NULL, value BLOB NOT NULL, "
+    "PRIMARY KEY (namespace, key))",
+    "CREATE INDEX IF NOT EXISTS entries_timestamp "
+    "ON entries (namespace, timestamp)",
+]
+
+# Only replace entries older than the merged ones
+_MERGE_QUERY = (
+    "INSERT OR REPLACE INTO entries (namespace, key, timestamp, value) "
+    "SELECT ?, ?, ?, ? WHERE NOT EXISTS (SELECT 1 FROM entries "
+    "WHERE namespace = ? AND key = ? AND timestamp >= ?)"
+)
+
+
+def _exception(message, ex):
+    # type: (str, Exception) -> CacheException
+
+    # Busy, locked, I/O or permission errors are transient, and must never
+    # make a cache be recreated: only files which are not SQLite databases or
+    # are corrupt are invalid
+    if isinstance(ex, sqlite3.DatabaseError) and not isinstance(
+        ex, sqlite3.OperationalError
+    ):
+        return InvalidCacheException(message)
+    return CacheException(message)
+
+
+def _check(connection, path):
+    # type: (sqlite3.Connection, str) -> None
+
+    try:
+        version = connection.execute("PRAGMA user_version").fetchone()[0]
+        snapshot_format = connection.execute(
+            "SELECT value FROM meta WHERE name = 'format'"
+        ).fetchone()
+    except sqlite3.OperationalError as ex:
+        if "no such table" in str(ex):
+            raise InvalidCacheException(
+                "{} is not a cache snapshot".format(path)
+            )
+        raise CacheException("Unable to read {}: {}".format(path, ex))
+    except sqlite3.Error as ex:
+        raise _exception("Invalid snapshot {}: {}".format(path, ex), ex)
+
+    if not snapshot_format or snapshot_format[0] != SNAPSHOT_FORMAT:
+        raise InvalidCacheException(
+            "{} is not a cache snapshot".format(path)
+        )
+    if version != SNAPSHOT_VERSION:
+        raise InvalidCacheException(
+            "Unsupported cache snapshot version {} in {}".format(
+                version, path
+            )
+        )
+
+
+def connect(path):
+    # type: (str) -> sqlite3.Connection
+
+    # Open a cache for reading and writing, creating it if needed
+    try:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(path)))
+        except OSError as ex:
+            if ex.errno != errno.EEXIST:
+                raise
+
+        connection = sqlite3.connect(
+            path, timeout=BUSY_TIMEOUT, check_same_thread=False
+        )
+        # Only take the write lock to create a new cache
+        if not connection.execute(
+            "SELECT 1 FROM sqlite_master "
+            "WHERE type = 'table' AND name = 'meta'"
+        ).fetchone():
+            with connection:
+                for statement in _SCHEMA:
+                    connection.execute(statement)
+                if not connection.execute("SELECT 1 FROM meta").fetchone():
+                    connection.executemany(
+                        "INSERT OR IGNORE INTO meta VALUES (?, ?)",
+                        [
+                            ("format", SNAPSHOT_FORMAT),
+                            ("last_prune", str(int(time.time()))),
+                        ],
+                    )
+                    connection.execute(
+                        "PRAGMA user_version = {}".format(SNAPSHOT_VERSION)
+                    )
+    except OSError as ex:
+        raise CacheException("Unable to open {}: {}".format(path, ex))
+    except sqlite3.Error as ex:
+        raise _exception("Unable to open {}: {}".format(path, ex), ex)
+
+    _check(connection, path)
+    return connection
+
+
+def connect_read_only(path):
+    # type: (str) -> sqlite3.Connection
+
+    # Never create missing snapshots
+    if not os.path.isfile(path):
+        raise CacheException("{} does not exist".format(path))
+
+    try:
+        try:
+            connection = sqlite3.connect(
+                "file:{}?mode=ro".format(pathname2url(os.path.abspath(path))),
+                timeout=BUSY_TIMEOUT,
+                check_same_thread=False,
+                uri=True,
+            )
+        except TypeError:
+            # Python 2 does not support URIs
+            connection = sqlite3.connect(
+                path, timeout=BUSY_TIMEOUT, check_same_thread=False
+            )
+        connection.execute("PRAGMA query_only = 1")
+        connection.execute("PRAGMA mmap_size = {}".format(MMAP_SIZE))
+    except sqlite3.Error as ex:
+        raise _exception("Unable to open {}: {}".format(path, ex), ex)
+
+    _check(connection, path)
+    return connection
+
+
+def _is_expired(namespace, timestamp, now):
+    # type: (str, float, float) -> bool
+
+    return now - timestamp > NAMESPACES[namespace]
+
+
+def _encode(value):
+    # type: (Any) -> Any
+
+    return sqlite3.Binary(
+        zlib.compress(json.dumps(value, separators=(",", ":")).encode("utf-8"))
+    )
+
+
+def _decode(blob):
+    # type: (Any) -> Any
+
+    return json.loads(zlib.decompress(bytes(blob)).decode("utf-8"))
+
+
+def iter_rows(connection, now=None):
+    # type: (sqlite3.Connection, Optional[float]) -> Iterator[Row]
+
+    # Live entries, with their values still encoded
+    now = now or time.time()
+    for namespace, ttl in NAMESPACES.items():
+        cursor = connection.execute(
+            "SELECT namespace, key, timestamp, value FROM entries "
+            "WHERE namespace = ? AND timestamp >= ?",
+            (namespace, int(now - ttl)),
+        )
+        # No "yield from" in Python 2
+        for row in cursor:  # pylint: disable=R1737
+            yield row
+
+
+def begin_write(connection):
+    # type: (sqlite3.Connection) -> None
+
+    # Take the write lock upfront, waiting for concurrent writers up to
+    # BUSY_TIMEOUT, rather than when upgrading a read transaction
+    connection.execute("BEGIN IMMEDIATE")
+
+
+def merge_rows(connection, rows):
+    # type: (sqlite3.Connection, Iterable[Row]) -> int
+
+    # Short transactions, so that concurrent writers can interleave
+    merged = 0
+    batch = []
+    for row in rows:
+        batch.append(row + row[:3])
+        if len(batch) >= MERGE_BATCH_SIZE:
+            with connection:
+                begin_write(connection)
+                connection.executemany(_MERGE_QUERY, batch)
+            merged += len(batch)
+            batch = []
+    if batch:
+        with connection:
+            begin_write(connection)
+            connection.executemany(_MERGE_QUERY, batch)
+        merged += len(batch)
+
+    return merged
+
+
+def prune(connection, now=None):
+    # type: (sqlite3.Connection, Optional[float]) -> None
+
+    now = now or time.time()
+    with connection:
+        for namespace, ttl in NAMESPACES.items():
+            connection.execute(
+                "DELETE FROM entries WHERE namespace = ? AND timestamp < ?",
+                (namespace, int(now - ttl)),
+            )
+        connection.execute(
+            "INSERT OR REPLACE INTO meta VALUES ('last_prune', ?)",
+            (str(int(now)),),
+        )
+
+
+def prune_if_due(connection, now=None):
+    # type: (sqlite3.Connection, Optional[float]) -> None
+
+    # Pruning is a write transaction over all entries: avoid doing it on
+    # every save
+    now = now or time.time()
+    last_prune = connection.execute(
+        "SELECT value FROM meta WHERE name = 'last_prune'"
+    ).fetchone()
+    if last_prune and now - int(last_prune[0]) < PRUNE_INTERVAL:
+        return
+
+    prune(connection, now)
+
+
+def snapshot_info(path):
+    # type: (str) -> Dict[str, Tuple[int, int]]
+
+    # Number of entries and of expired entries, by namespace
+    connection = connect_read_only(path)
+    now = time.time()
+    info = {}
+    try:
+        for namespace, ttl in NAMESPACES.items():
+            info[namespace] = connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(timestamp < ?), 0) "
+                "FROM entries WHERE namespace = ?",
+                (int(now - ttl), namespace),
+            ).fetchone()
+    except sqlite3.Error as ex:
+        raise CacheException("Invalid snapshot {}: {}".format(path, ex))
+    finally:
+        connection.close()
+
+    return info
+
+
+def export_snapshot(sources, output):
+    # type: (Iterable[str], str) -> None
+
+    sources = [connect_read_only(s) for s in sources]
+
+    directory = os.path.dirname(os.path.abspath(output))
+    handle, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    os.close(handle)
+
+    # Build the snapshot aside then rename it, so that readers always see a
+    # complete one
+    try:
+        snapshot = connect(temp_path)
+        try:
+            for source in sources:
+                merge_rows(snapshot, iter_rows(source))
+            snapshot.execute("VACUUM")
+        finally:
+            snapshot.close()
+
+        # mkstemp() creates private files, snapshots are meant to be shared
+        os.chmod(temp_path, 0o644)
+        try:
+            os.replace(temp_path, output)  # type: ignore
+        except AttributeError:
+            # Python 2
+            if os.path.exists(output):
+                os.remove(output)
+            os.rename(temp_path, output)
+    except (OSError, sqlite3.Error) as ex:
+        raise CacheException("Unable to write {}: {}".format(output, ex))
+    finally:
+        for source in sources:
+            source.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+
+
+def import_snapshot(snapshot, target):
+    # type: (str, str) -> int
+
+    source = connect_read_only(snapshot)
+    try:
+        destination = connect(target)
+        try:
+            merged = merge_rows(destination, iter_rows(source))
+            prune(destination)
+            return merged
+        except sqlite3.Error as ex:
+            raise CacheException(
+                "Unable to import into {}: {}".format(target, ex)
+            )
+        finally:
+            destination.close()
+    finally:
+        source.close()
+
+
+class ResponseCache:
+    def __init__(self, path, seed_path=None):
+        # type: (str, Optional[str]) -> None
+
+        self._path = path
+        self._seed_path = seed_path
+
+        # Databases are opened on first use only, and set to False once found
+        # unusable
+        self._connection = None  # type: Any
+        self._seed_connection = None if seed_path else False  # type: Any
+        self._new_entries = {}  # type: Dict[Tuple[str, str], Row]
+
+        self.lock = threading.Lock()
+
+    def _local(self):
+        # type: () -> sqlite3.Connection
+
+        if not self._connection:
+            try:
+                try:
+                    self._connection = connect(self._path)
+                except InvalidCacheException:
+                    # Corrupt or incompatible cache: start over. Any other
+                    # error (such as a busy database) leaves it untouched
+                    for suffix in ("", "-journal"):
+                        if os.path.exists(self._path + suffix):
+                            os.remove(self._path + suffix)
+                    self._connection = connect(self._path)
+            except (CacheException, EnvironmentError):
+                self._connection = False
+                raise
+
+        return self._connection
+
+    def _seed(self):
+        # type: () -> sqlite3.Connection
+
+        if self._seed_connection is None:
+            try:
+                self._seed_connection = connect_read_only(str(self._seed_path))
+            except CacheException:
+                self._seed_connection = False
+                raise
+
+        return self._seed_connection
+
+    @staticmethod
+    def _lookup(open_database, namespace, key, now):
+        # type: (Any, str, str, float) -> Optional[Tuple[Row, Any]]
+
+        # A damaged cache or snapshot must never make a scrape fail: any
+        # error is a cache miss
+        try:
+            row = (
+                open_database()
+                .execute(
+                    "SELECT namespace, key, timestamp, value FROM entries "
+                    "WHERE namespace = ? AND key = ? AND timestamp >= ?",
+                    (namespace, key, int(now - NAMESPACES[namespace])),
+                )
+                .fetchone()
+            )
+            return (row, _decode(row[3])) if row else None
+        except (
+            CacheException,
+            EnvironmentError,
+            sqlite3.Error,
+            ValueError,
+            zlib.error,
+        ):
+            return None
+
+    def get(self, namespace, key):
+        # type: (str, str) -> Optional[Any]
+
+        now = time.time()
+        with self.lock:
+            row = self._new_entries.get((namespace, key))
+            if row and not _is_expired(namespace, row[2], now):
+                return _decode(row[3])
+
+            if self._connection is not False:
+                result = self._lookup(self._local, namespace, key, now)
+                if result:
+                    return result[1]
+
+            if self._seed_connection is not False:
+                result = self._lookup(self._seed, namespace, key, now)
+                if result:
+                    # Keep data from the shared snapshot locally
+                    self._new_entries[(namespace, key)] = result[0]
+                    return result[1]
+
+        return None
+
+    def set(self, namespace, key, value):
+        # type: (str, str, Any) -> None
+
+        with self.lock:
+            self._new_entries[(namespace, key)] = (
+                namespace,
+                key,
+                int(time.time()),
+                _encode(value),
+            )
+
+    def save(self):
+        # type: () -> None
+
+        with self.lock:
+            if not self._new_entries:
+                return
+
+            try:
+                connection = self._local()
+                merge_rows(connection, self._new_entries.values())
+            except (EnvironmentError, sqlite3.Error) as ex:
+                raise CacheException(
+                    "Unable to save {}: {}".format(self._path, ex)
+                )
+
+            self._new_entries = {}
+
+            try:
+                prune_if_due(connection)
+            except (sqlite3.Error, ValueError):
+                # Left to a later save
+                pass
@@ -0,0 +1,32 @@
+# coding: utf-8
+# Copyright © 2020 melmorabity
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+# Kept apart from the api module so that catching API errors does not require
+# importing requests and urllib3
+
+
+class AlloCineException(Exception):
+    pass
+
+
+class CacheException(Exception):
+    pass
+
+
+class InvalidCacheException(CacheException):
+    # Not a cache, or an incompatible one, as opposed to an unavailable one
+    pass
@@ -0,0 +1,103 @@
+# coding: utf-8
+# Copyright © 2020 melmorabity
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+# Opt-in profiling of scraper invocations. Each invocation is dumped to a
+# pstats file in the add-on profile directory; tools/profile_report.py
+# aggregates them.
+
+import cProfile
+import errno
+import os
+import re
+import time
+
+try:
+    from typing import Any
+    from typing import Callable
+    from typing import Optional
+except ImportError:
+    pass
+
+
+PROFILE_DIR_NAME = "profiles"
+PROFILE_FILE_EXTENSION = ".pstats"
+MAX_PROFILE_FILES = 100
+
+
+def _sanitize(value):
+    # type: (Optional[Any]) -> str
+
+    return re.sub(r"[^A-Za-z0-9]+", "_", str(value or "none")).strip("_")[:40]
+
+
+def _rotate(directory, max_files):
+    # type: (str, int) -> None
+
+    # Always keep the dump just written
+    max_files = max(max_files, 1)
+
+    # File names start with a timestamp, so they sort chronologically
+    dumps = sorted(
+        f for f in os.listdir(directory) if f.endswith(PROFILE_FILE_EXTENSION)
+    )
+    for name in dumps[: max(len(dumps) - max_files, 0)]:
+        try:
+            os.remove(os.path.join(directory, name))
+        except OSError:
+            # Removed concurrently by another invocation
+            pass
+
+
+def profile_call(
+    directory, action, movie_id, func, max_files=MAX_PROFILE_FILES
+):
+    # type: (str, Optional[str], Optional[Any], Callable[[], Any], int) -> Any
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        return func()
+    finally:
+        profiler.disable()
+
+        try:
+            _dump(profiler, directory, action, movie_id, max_files)
+        except (IOError, OSError):
+            # Profiling must never make a scrape fail
+            pass
+
+
+def _dump(profiler, directory, action, movie_id, max_files):
+    # type: (cProfile.Profile, str, Optional[str], Optional[Any], int) -> None
+
+    try:
+        os.makedirs(directory)
+    except OSError as ex:
+        if ex.errno != errno.EEXIST:
+            raise
+
+    now = time.time()
+    file_name = "{}.{:03d}-{}-{}-{}{}".format(
+        time.strftime("%Y%m%d-%H%M%S", time.localtime(now)),
+        int(now * 1000) % 1000,
+        os.getpid(),
+        _sanitize(action),
+        _sanitize(movie_id),
+        PROFILE_FILE_EXTENSION,
+    )
+    profiler.dump_stats(os.path.join(directory, file_name))
+    _rotate(directory, max_files)
@@ -19,12 +19,13 @@ import os
 import re
 
 try:
+    from typing import TYPE_CHECKING
     from typing import Any
     from typing import Dict
     from typing import List
     from typing import Optional
 except ImportError:
-    pass
+    TYPE_CHECKING = False
 
 try:
     from urllib.parse import parse_qsl
@@ -32,23 +33,25 @@ except ImportError:
     from urlparse import parse_qsl
 
 import xbmc  # pylint: disable=E0401
-from xbmcaddon import Addon  # pylint: disable=E0401
 from xbmcgui import Dialog  # pylint: disable=E0401
 from xbmcgui import ListItem  # pylint: disable=E0401
 import xbmcplugin  # pylint: disable=E0401
 
-from .api import AlloCine
-from .api import AlloCineException
+from .exceptions import AlloCineException
+from .exceptions import CacheException
+
+if TYPE_CHECKING:
+    from xbmcaddon import Addon  # pylint: disable=E0401
+
+    from .api import AlloCine
+    from .cache import ResponseCache
 
 
 class AlloCineAddon:
     _ADDON_ID = "metadata.allocine.fr.python"
-    _ADDON = Addon(id=_ADDON_ID)
-    _ADDON_NAME = _ADDON.getAddonInfo("name")
-    _ADDON_DIR = xbmc.translatePath(_ADDON.getAddonInfo("path"))
-    _ADDON_ICON = os.path.join(_ADDON_DIR, "resources", "icon.png")
 
-    _NFO_URL_RE = re.compile(
+    # Compiled (and cached by the re module) on first use only
+    _NFO_URL_RE = (
         r"https?://(?:www)?\.allocine\.fr/film/fichefilm_gen_cfilm="
         r"(?P<id>\d+)\.html"
     )
@@ -58,21 +61,107 @@ class AlloCineAddon:
 
     _TMDB_IMAGE_URL_TEMPLATE = "https://image.tmdb.org/t/p/{}{}"
 
+    _PROFILING_ENV_VARIABLE = "ALLOCINE_PROFILE"
+
+    _CACHE_FILE_NAME = "cache.sqlite"
+
     def __init__(self, handle, params):
         # type: (int, str) -> None
 
         self._handle = handle
         self._params = self._params_to_dict(params)
 
-        self._trailer_quality_id = self._TRAILER_QUALITY_IDS[
-            int(self._ADDON.getSetting("trailer_quality"))
+        # Kodi add-on handle, settings and API client are only set up when an
+        # action actually needs them, to keep short invocations (such as
+        # NfoUrl) cheap on low-end devices
+        self._addon_instance = None  # type: Optional[Addon]
+        self._settings = {}  # type: Dict[str, str]
+        self._api_instance = None  # type: Optional[AlloCine]
+        self._cache_instance = None  # type: Optional[ResponseCache]
+
+    @property
+    def _addon(self):
+        # type: () -> Addon
+
+        if self._addon_instance is None:
+            import xbmcaddon  # pylint: disable=C0415,E0401
+
+            self._addon_instance = xbmcaddon.Addon(id=self._ADDON_ID)
+
+        return self._addon_instance
+
+    @property
+    def _api(self):
+        # type: () -> AlloCine
+
+        if self._api_instance is None:
+            # Importing requests and urllib3 is costly
+            from . import api  # pylint: disable=C0415
+
+            self._api_instance = api.AlloCine(cache=self._cache)
+
+        return self._api_instance
+
+    @property
+    def _cache(self):
+        # type: () -> Optional[ResponseCache]
+
+        if (
+            self._cache_instance is None
+            and self._addon.getSetting("cache") == "true"
+        ):
+            from . import cache  # pylint: disable=C0415
+
+            seed_path = self._addon.getSetting("cache_snapshot")
+            self._cache_instance = cache.ResponseCache(
+                os.path.join(
+                    xbmc.translatePath(self._addon.getAddonInfo("profile")),
+                    self._CACHE_FILE_NAME,
+                ),
+                seed_path=xbmc.translatePath(seed_path) if seed_path else None,
+            )
+
+        return self._cache_instance
+
+    def _save_cache(self):
+        # type: () -> None
+
+        if self._cache_instance is None:
+            return
+
+        try:
+            self._cache_instance.save()
+        except CacheException as ex:
+            self._log(str(ex), xbmc.LOGWARNING)
+
+    def _get_setting(self, setting_id):
+        # type: (str) -> str
+
+        # Each setting is only read once per invocation
+        if setting_id not in self._settings:
+            self._settings[setting_id] = self._addon.getSetting(setting_id)
+
+        return self._settings[setting_id]
+
+    @property
+    def _trailer_quality_id(self):
+        # type: () -> int
+
+        return self._TRAILER_QUALITY_IDS[
+            int(self._get_setting("trailer_quality"))
         ]
-        self._get_tmdb_data = self._ADDON.getSetting("tmdb_data") == "true"
-        self._get_tmdb_artwork = (
-            self._ADDON.getSetting("tmdb_artwork") == "true"
-        )
 
-        self._api = AlloCine()
+    @property
+    def _get_tmdb_data(self):
+        # type: () -> bool
+
+        return self._get_setting("tmdb_data") == "true"
+
+    @property
+    def _get_tmdb_artwork(self):
+        # type: () -> bool
+
+        return self._get_setting("tmdb_artwork") == "true"
 
     @staticmethod
     def _params_to_dict(params):
@@ -89,19 +178,24 @@ class AlloCineAddon:
     def _notification(self, message):
         # type: (str) -> None
 
+        addon_dir = xbmc.translatePath(self._addon.getAddonInfo("path"))
+
         Dialog().notification(
-            self._ADDON_NAME, message, icon=self._ADDON_ICON,
+            self._addon.getAddonInfo("name"),
+            message,
+            icon=os.path.join(addon_dir, "resources", "icon.png"),
         )
 
     def _get_trailer(self, media_id):
         # type: (int) -> Optional[str]
 
         result = None
+        trailer_quality_id = self._trailer_quality_id
 
         for rendition in self._api.get_media(media_id).get("rendition", []):
             url = rendition.get("href")
             quality = rendition.get("bandwidth", {}).get("code")
-            if url and quality and quality <= self._trailer_quality_id:
+            if url and quality and quality <= trailer_quality_id:
                 result = url
 
         return result
@@ -339,7 +433,7 @@ class AlloCineAddon:
         if not nfo_url:
             return None
 
-        match = self._NFO_URL_RE.search(nfo_url)
+        match = re.search(self._NFO_URL_RE, nfo_url)
         if not match:
             return None
 
@@ -422,9 +516,65 @@ class AlloCineAddon:
                 isFolder=True,
             )
 
+    def _profiling_enabled(self):
+        # type: () -> bool
+
+        # Checked first, as it does not require loading the add-on settings
+        if os.environ.get(self._PROFILING_ENV_VARIABLE, "").lower() in (
+            "1",
+            "true",
+            "yes",
+        ):
+            return True
+
+        # NfoUrl never needs the add-on settings otherwise: do not load them
+        # just to check this one, so such invocations can only be profiled
+        # from the environment
+        if self._params.get("action") == "NfoUrl":
+            return False
+
+        return self._get_setting("profiling") == "true"
+
+    def _run_profiled(self):
+        # type: () -> None
+
+        from . import profiling  # pylint: disable=C0415
+
+        action = self._params.get("action")
+        if action == "NfoUrl":
+            movie_id = self._movie_id_from_nfo_url()  # type: Any
+        elif action == "getdetails":
+            movie_id = self._params.get("url")
+        else:
+            movie_id = self._params.get("title")
+
+        try:
+            max_files = int(self._get_setting("profiling_max_files"))
+        except ValueError:
+            max_files = profiling.MAX_PROFILE_FILES
+
+        profiling.profile_call(
+            os.path.join(
+                xbmc.translatePath(self._addon.getAddonInfo("profile")),
+                profiling.PROFILE_DIR_NAME,
+            ),
+            action,
+            movie_id,
+            self._run,
+            max_files=max_files,
+        )
+
     def run(self):
         # type: () -> None
 
+        if self._profiling_enabled():
+            self._run_profiled()
+        else:
+            self._run()
+
+    def _run(self):
+        # type: () -> None
+
         action = self._params.get("action")
         succeeded = True
 
@@ -437,7 +587,9 @@ class AlloCineAddon:
                 self._action_find()
         except AlloCineException as ex:
             self._log(str(ex), xbmc.LOGERROR)
-            self._notification(self._ADDON.getLocalizedString(30400))
+            self._notification(self._addon.getLocalizedString(30400))
             succeeded = False
         finally:
             xbmcplugin.endOfDirectory(self._handle, succeeded=succeeded)
+            # Once Kodi got the results
+            self._save_cache()
@@ -0,0 +1,158 @@
+# coding: utf-8
+# Copyright © 2020 melmorabity
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+# Measure the scraper cold start: interpreter start, module import and first
+# action time for each scraper action. Every sample runs in a fresh
+# interpreter, against a local fake upstream and stubbed Kodi modules.
+#
+# Usage: python tools/bench_startup.py [--runs N] [ACTION...]
+
+import argparse
+import json
+import os
+import subprocess  # nosec
+import sys
+import time
+
+try:
+    from typing import Dict
+    from typing import List
+except ImportError:
+    pass
+
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ACTIONS = {
+    "NfoUrl": "?action=NfoUrl&nfo=https%3A%2F%2Fwww.allocine.fr%2Ffilm%2F"
+    "fichefilm_gen_cfilm%3D1234.html",
+    "find": "?action=find&title=Amelie",
+    "getdetails": "?action=getdetails&url=1234",
+}
+
+PHASES = ["process", "import", "api_import", "action"]
+
+
+def _child(action):
+    # type: (str) -> None
+
+    # pylint: disable=C0415
+    sys.path.insert(0, ROOT_DIR)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import kodistubs
+
+    kodistubs.install(addon_path=ROOT_DIR)
+
+    timings = {}  # type: Dict[str, float]
+
+    start = time.time()
+    from resources.lib.scraper import AlloCineAddon
+
+    timings["import"] = time.time() - start
+
+    upstream = None
+    timings["api_import"] = 0.0
+    if action != "NfoUrl":
+        # Timed apart, as the local server setup must not count as import
+        # time; the scraper imports the module lazily on first API call
+        from fakeupstream import FakeUpstream
+
+        upstream = FakeUpstream()
+        upstream.start()
+
+        start = time.time()
+        from resources.lib.api import AlloCine
+
+        timings["api_import"] = time.time() - start
+        upstream.patch(AlloCine)
+
+    start = time.time()
+    AlloCineAddon(1, ACTIONS[action]).run()
+    timings["action"] = time.time() - start
+
+    if upstream:
+        upstream.stop()
+
+    if action == "NfoUrl" and "requests" in sys.modules:
+        sys.stderr.write("warning: NfoUrl pulled in requests\n")
+
+    json.dump(timings, sys.stdout)
+
+
+def _sample(action):
+    # type: (str) -> Dict[str, float]
+
+    start = time.time()
+    output = subprocess.check_output(  # nosec
+        [sys.executable, os.path.abspath(__file__), "--child", action]
+    )
+    process = time.time() - start
+
+    timings = json.loads(output.decode("utf-8"))
+    timings["process"] = process
+    return timings
+
+
+def _median(values):
+    # type: (List[float]) -> float
+
+    values = sorted(values)
+    middle = len(values) // 2
+    if len(values) % 2:
+        return values[middle]
+    return (values[middle - 1] + values[middle]) / 2.0
+
+
+def main():
+    # type: () -> None
+
+    parser = argparse.ArgumentParser(
+        description="Measure the scraper cold start time"
+    )
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("actions", nargs="*", metavar="ACTION")
+    args = parser.parse_args()
+
+    for action in args.actions + ([args.child] if args.child else []):
+        if action not in ACTIONS:
+            parser.error("unknown action: {}".format(action))
+
+    if args.child:
+        _child(args.child)
+        return
+
+    print(
+        "{:<12}".format("action")
+        + "".join("{:>14}".format(p + " ms") for p in PHASES)
+    )
+    for action in args.actions or sorted(ACTIONS):
+        samples = [_sample(action) for _ in range(args.runs)]
+        print(
+            "{:<12}".format(action)
+            + "".join(
+                "{:>14.1f}".format(
+                    _median([s[phase] for s in samples]) * 1000
+                )
+                for phase in PHASES
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
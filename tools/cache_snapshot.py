@@ -0,0 +1,194 @@
+# coding: utf-8
+# Copyright © 2020 melmorabity
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+# Manage the cache snapshots shared between scraper clients (see
+# resources/lib/cache.py):
+#
+# * info SNAPSHOT...: show snapshot contents
+# * export -o OUTPUT CACHE...: merge client cache files into one compact
+#   snapshot, without expired entries
+# * import SNAPSHOT TARGET: merge a snapshot into a client cache file, in
+#   small transactions so that running scrapes are not locked out
+# * warm -o OUTPUT TITLE...: headless batch run, scraping the given titles
+#   (search, then details of the best match) to build a snapshot
+
+import argparse
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+try:
+    from typing import List
+except ImportError:
+    pass
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# pylint: disable=C0413
+from resources.lib import cache  # noqa: E402
+from resources.lib.exceptions import CacheException  # noqa: E402
+
+
+def _info(args):
+    # type: (argparse.Namespace) -> None
+
+    for path in args.snapshots:
+        info = cache.snapshot_info(path)
+        print(
+            "{}: {} bytes, modified {}".format(
+                path,
+                os.path.getsize(path),
+                time.strftime(
+                    "%Y-%m-%d %H:%M:%S",
+                    time.localtime(os.path.getmtime(path)),
+                ),
+            )
+        )
+        for namespace in sorted(cache.NAMESPACES):
+            print(
+                "  {:<10} {:>8} entries ({} expired)".format(
+                    namespace, *info[namespace]
+                )
+            )
+
+
+def _export(args):
+    # type: (argparse.Namespace) -> None
+
+    cache.export_snapshot(args.caches, args.output)
+
+
+def _import(args):
+    # type: (argparse.Namespace) -> None
+
+    print(
+        "{} entries merged".format(
+            cache.import_snapshot(args.snapshot, args.target)
+        )
+    )
+
+
+def _read_titles(args):
+    # type: (argparse.Namespace) -> List[str]
+
+    titles = list(args.titles)
+    if args.titles_file:
+        with io.open(args.titles_file, encoding="utf-8") as titles_file:
+            titles.extend(t.strip() for t in titles_file if t.strip())
+    return titles
+
+
+def _warm(args):
+    # type: (argparse.Namespace) -> None
+
+    # pylint: disable=C0415,W0212
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+    import kodistubs
+
+    profile_path = tempfile.mkdtemp(prefix="allocine-warm-")
+    kodistubs.install(
+        settings={"cache": "true"},
+        addon_path=os.path.dirname(os.path.dirname(__file__)),
+        profile_path=profile_path,
+    )
+
+    from resources.lib.scraper import AlloCineAddon
+
+    try:
+        for handle, title in enumerate(_read_titles(args)):
+            AlloCineAddon(
+                handle * 2, "?" + urlencode({"action": "find", "title": title})
+            ).run()
+            urls = [
+                i[1]
+                for i in kodistubs.DIRECTORIES.get(handle * 2, [])
+                if i[0] == "item"
+            ]
+            if not urls:
+                print("{}: no match".format(title))
+                continue
+
+            AlloCineAddon(
+                handle * 2 + 1,
+                "?" + urlencode({"action": "getdetails", "url": urls[0]}),
+            ).run()
+            print("{}: {}".format(title, urls[0]))
+
+        # Merge into an existing snapshot
+        sources = [os.path.join(profile_path, AlloCineAddon._CACHE_FILE_NAME)]
+        if os.path.exists(args.output):
+            sources.append(args.output)
+        cache.export_snapshot(sources, args.output)
+    finally:
+        shutil.rmtree(profile_path)
+
+
+def main():
+    # type: () -> None
+
+    parser = argparse.ArgumentParser(
+        description="Manage scraper cache snapshots"
+    )
+    subparsers = parser.add_subparsers(dest="command")
+    subparsers.required = True
+
+    info_parser = subparsers.add_parser("info", help="show snapshot contents")
+    info_parser.add_argument("snapshots", nargs="+", metavar="SNAPSHOT")
+    info_parser.set_defaults(func=_info)
+
+    export_parser = subparsers.add_parser(
+        "export", help="merge cache files into a snapshot"
+    )
+    export_parser.add_argument("-o", "--output", required=True)
+    export_parser.add_argument("caches", nargs="+", metavar="CACHE")
+    export_parser.set_defaults(func=_export)
+
+    import_parser = subparsers.add_parser(
+        "import", help="merge a snapshot into a cache file"
+    )
+    import_parser.add_argument("snapshot", metavar="SNAPSHOT")
+    import_parser.add_argument("target", metavar="TARGET")
+    import_parser.set_defaults(func=_import)
+
+    warm_parser = subparsers.add_parser(
+        "warm", help="scrape titles to build a snapshot"
+    )
+    warm_parser.add_argument("-o", "--output", required=True)
+    warm_parser.add_argument(
+        "-f", "--titles-file", help="file with one title per line"
+    )
+    warm_parser.add_argument("titles", nargs="*", metavar="TITLE")
+    warm_parser.set_defaults(func=_warm)
+
+    args = parser.parse_args()
+    try:
+        args.func(args)
+    except CacheException as ex:
+        parser.exit(1, "error: {}\n".format(ex))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,361 @@
+# coding: utf-8
+# Copyright © 2020 melmorabity
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+# Local HTTP server mimicking the AlloCiné, Wikidata and TMDB endpoints used
+# by the scraper, returning small canned responses. It can simulate upstream
+# latency and enforce a rate limit (token bucket), answering 429 errors with a
+# Retry-After header beyond it.
+
+import json
+import re
+import threading
+import time
+
+try:
+    from http.server import BaseHTTPRequestHandler
+    from http.server import HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import parse_qs
+    from urllib.parse import urlparse
+except ImportError:
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from BaseHTTPServer import HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import parse_qs
+    from urlparse import urlparse
+
+try:
+    from typing import Any
+    from typing import Dict
+    from typing import Optional
+    from typing import Tuple
+
+    Response = Tuple[int, Dict[str, Any], Dict[str, str]]
+except ImportError:
+    pass
+
+
+def _search(query):
+    # type: (Dict[str, Any]) -> Dict[str, Any]
+
+    title = query.get("q", ["Movie"])[0]
+    return {
+        "feed": {
+            "movie": [
+                {
+                    "code": 1000 + i,
+                    "title": "{} {}".format(title, i),
+                    "productionYear": 2000 + i,
+                    "poster": {
+                        "href": "https://example.org/p/{}.jpg".format(i)
+                    },
+                }
+                for i in range(10)
+            ]
+        }
+    }
+
+
+def _movie(query):
+    # type: (Dict[str, Any]) -> Dict[str, Any]
+
+    code = int(query.get("code", ["1"])[0])
+    return {
+        "movie": {
+            "code": code,
+            "title": "Movie {}".format(code),
+            "originalTitle": "Movie {}".format(code),
+            "synopsis": "Synopsis " * 50,
+            "synopsisShort": "Synopsis",
+            "runtime": 6000,
+            "productionYear": 2000,
+            "genre": [{"$": "drame"}, {"$": "comédie"}],
+            "nationality": [{"$": "France"}],
+            "release": {"releaseDate": "2000-01-01"},
+            "statistics": {"userRating": 3.5, "userRatingCount": 100},
+            "trailer": {"code": code},
+            "poster": {"href": "https://example.org/p/0.jpg"},
+            "castMember": [
+                {
+                    "person": {"name": "Person {}".format(i)},
+                    "activity": {"code": 8001 if i % 4 else 8002},
+                    "role": "Role {}".format(i),
+                    "picture": {"href": "https://example.org/c.jpg"},
+                }
+                for i in range(20)
+            ],
+            "media": [
+                {
+                    "type": {"code": 31001 if i % 2 else 31006},
+                    "width": 1920 if i % 2 == 0 else 600,
+                    "height": 1080 if i % 2 == 0 else 800,
+                    "thumbnail": {
+                        "href": "https://example.org/pictures/{}.jpg".format(
+                            i
+                        )
+                    },
+                }
+                for i in range(20)
+            ],
+        }
+    }
+
+
+def _media(query):  # pylint: disable=W0613
+    # type: (Dict[str, Any]) -> Dict[str, Any]
+
+    return {
+        "media": {
+            "rendition": [
+                {
+                    "href": "https://example.org/t/{}.mp4".format(quality),
+                    "bandwidth": {"code": quality},
+                }
+                for quality in (104001, 104002, 104003, 104004)
+            ]
+        }
+    }
+
+
+def _wikidata(query):
+    # type: (Dict[str, Any]) -> Dict[str, Any]
+
+    match = re.search(r'P1265 "(\d+)"', query.get("query", [""])[0])
+    movie_id = match.group(1) if match else "0"
+    return {
+        "results": {"bindings": [{"imdb": {"value": "tt{}".format(movie_id)}}]}
+    }
+
+
+def _tmdb_find(imdb_id):
+    # type: (str) -> Dict[str, Any]
+
+    return {"movie_results": [{"id": int(imdb_id)}]}
+
+
+def _tmdb_movie(tmdb_id):
+    # type: (str) -> Dict[str, Any]
+
+    tmdb_id = int(tmdb_id)
+    return {
+        "id": tmdb_id,
+        "imdb_id": "tt{}".format(tmdb_id),
+        "tagline": "Tagline",
+        "original_language": "en",
+        "production_companies": [{"name": "Studio"}],
+        "belongs_to_collection": None,
+    }
+
+
+def _tmdb_images(tmdb_id):  # pylint: disable=W0613
+    # type: (str) -> Dict[str, Any]
+
+    return {
+        kind: [
+            {"file_path": "/{}{}.jpg".format(kind, i), "iso_639_1": lang}
+            for i, lang in enumerate(["en", "fr", None, "de"])
+        ]
+        for kind in ("posters", "backdrops")
+    }
+
+
+_ROUTES = [
+    (re.compile(r"^/rest/v3/search$"), _search),
+    (re.compile(r"^/rest/v3/movie$"), _movie),
+    (re.compile(r"^/rest/v3/media$"), _media),
+    (re.compile(r"^/sparql$"), _wikidata),
+    (re.compile(r"^/3/find/tt(\d+)$"), _tmdb_find),
+    (re.compile(r"^/3/movie/(\d+)/images$"), _tmdb_images),
+    (re.compile(r"^/3/movie/(\d+)$"), _tmdb_movie),
+]
+
+
+def route(path, query):
+    # type: (str, Dict[str, Any]) -> Optional[Dict[str, Any]]
+
+    for path_re, handler in _ROUTES:
+        match = path_re.match(path)
+        if match:
+            # TMDB handlers take the ID from the path, others the query
+            return handler(*(match.groups() or (query,)))
+    return None
+
+
+def patch_api(api_class, url):
+    # type: (Any, str) -> None
+
+    # Redirect every API endpoint of the given AlloCine class to a fake
+    # upstream, possibly running in another process
+    # pylint: disable=W0212
+    api_class._ALLOCINE_API_URL = url + "/rest/v3"
+    api_class._WIKIDATA_API_URL = url + "/sparql"
+    api_class._TMDB_API_URL = url + "/3"
+
+
+class _Handler(BaseHTTPRequestHandler):
+    server = None  # type: _Server
+
+    def log_message(self, *args):
+        # type: (*Any) -> None
+
+        pass
+
+    def _send_json(self, status, data, headers=None):
+        # type: (int, Dict[str, Any], Optional[Dict[str, str]]) -> None
+
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):  # pylint: disable=C0103
+        # type: () -> None
+
+        url = urlparse(self.path)
+        status, data, headers = self.server.upstream.handle(
+            url.path, parse_qs(url.query)
+        )
+        self._send_json(status, data, headers)
+
+
+class _Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+    # The default backlog (5) makes concurrent clients wait for SYN retries
+    request_queue_size = 128
+    upstream = None  # type: FakeUpstream
+
+
+class FakeUpstream:
+    # pylint: disable=R0902
+
+    def __init__(  # pylint: disable=R0913
+        self,
+        host="127.0.0.1",
+        port=0,
+        latency=0.0,
+        rate_limit=0.0,
+        burst=1,
+        retry_after=1,
+    ):
+        # type: (str, int, float, float, int, int) -> None
+
+        self._server = _Server((host, port), _Handler)
+        self._server.upstream = self
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, kwargs={"poll_interval": 0.05}
+        )
+        self._thread.daemon = True
+
+        # Seconds per response, requests per second (0 for no limit)
+        self.latency = latency
+        self.rate_limit = rate_limit
+        self.burst = burst
+        self.retry_after = retry_after
+
+        self.requests = 0
+        self.throttled = 0
+        self._tokens = float(burst)
+        self._last_refill = time.time()
+        self._lock = threading.Lock()
+
+    @property
+    def url(self):
+        # type: () -> str
+
+        host, port = self._server.server_address[:2]
+        return "http://{}:{}".format(host, port)
+
+    def __enter__(self):
+        # type: () -> FakeUpstream
+
+        self.start()
+        return self
+
+    def __exit__(self, *args):
+        # type: (*Any) -> None
+
+        self.stop()
+
+    def start(self):
+        # type: () -> None
+
+        self._thread.start()
+
+    def stop(self):
+        # type: () -> None
+
+        self._server.shutdown()
+        self._server.server_close()
+
+    def reset_stats(self):
+        # type: () -> None
+
+        with self._lock:
+            self.requests = 0
+            self.throttled = 0
+
+    def _is_throttled(self):
+        # type: () -> bool
+
+        # Must be called with the lock held
+        if not self.rate_limit:
+            return False
+
+        now = time.time()
+        self._tokens = min(
+            float(self.burst),
+            self._tokens + (now - self._last_refill) * self.rate_limit,
+        )
+        self._last_refill = now
+
+        if self._tokens < 1:
+            self.throttled += 1
+            return True
+
+        self._tokens -= 1
+        return False
+
+    def handle(self, path, query):
+        # type: (str, Dict[str, Any]) -> Response
+
+        with self._lock:
+            self.requests += 1
+            throttled = self._is_throttled()
+
+        if throttled:
+            return (
+                429,
+                {"error": {"$": "Too many requests"}},
+                {"Retry-After": str(self.retry_after)},
+            )
+
+        if self.latency:
+            time.sleep(self.latency)
+
+        data = route(path, query)
+        if data is None:
+            return 404, {"error": {"$": "Not found"}}, {}
+        return 200, data, {}
+
+    def patch(self, api_class):
+        # type: (Any) -> None
+
+        patch_api(api_class, self.url)
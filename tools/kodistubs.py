@@ -0,0 +1,182 @@
+# coding: utf-8
+# Copyright © 2020 melmorabity
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+# Minimal stand-ins for the Kodi Python modules, so that the scraper can be
+# driven outside of Kodi by the development tools in this directory
+
+import sys
+import tempfile
+import threading
+import types
+
+try:
+    from typing import Any
+    from typing import Dict
+    from typing import List
+    from typing import Optional
+except ImportError:
+    pass
+
+
+DEFAULT_SETTINGS = {
+    "trailer_quality": "0",
+    "tmdb_data": "true",
+    "tmdb_artwork": "true",
+    "profiling": "false",
+    "profiling_max_files": "100",
+    "cache": "false",
+    "cache_snapshot": "",
+}
+
+# Directory items and resolved URLs, by plugin handle
+DIRECTORIES = {}  # type: Dict[int, List[Any]]
+_DIRECTORIES_LOCK = threading.Lock()
+
+
+def _record(handle, item):
+    # type: (int, Any) -> None
+
+    with _DIRECTORIES_LOCK:
+        DIRECTORIES.setdefault(handle, []).append(item)
+
+
+class _Addon:
+    def __init__(self, id=None):  # pylint: disable=W0622
+        # type: (Optional[str]) -> None
+
+        self._id = id
+
+    @staticmethod
+    def getSetting(key):  # pylint: disable=C0103
+        # type: (str) -> str
+
+        return SETTINGS.get(key, "")
+
+    def getAddonInfo(self, key):  # pylint: disable=C0103
+        # type: (str) -> str
+
+        return {
+            "id": self._id or "",
+            "name": "AlloCiné",
+            "path": ADDON_PATH,
+            "profile": PROFILE_PATH,
+        }.get(key, "")
+
+    @staticmethod
+    def getLocalizedString(string_id):  # pylint: disable=C0103
+        # type: (int) -> str
+
+        return str(string_id)
+
+
+class _ListItem:
+    def __init__(self, label="", offscreen=False):
+        # type: (str, bool) -> None
+
+        self.label = label
+        self.offscreen = offscreen
+        self.data = {}  # type: Dict[str, Any]
+
+    def __getattr__(self, name):
+        # type: (str) -> Any
+
+        # setInfo(), setCast(), setArt(), addAvailableArtwork()...
+        def setter(*args, **kwargs):
+            # type: (*Any, **Any) -> None
+
+            self.data.setdefault(name, []).append((args, kwargs))
+
+        return setter
+
+
+class _Dialog:
+    @staticmethod
+    def notification(heading, message, icon="", time=0, sound=True):
+        # type: (str, str, str, int, bool) -> None
+
+        pass
+
+
+def _log(msg, level=0):
+    # type: (str, int) -> None
+
+    if level >= LOG_LEVEL:
+        sys.stderr.write("{}\n".format(msg))
+
+
+def _add_directory_item(handle, url, listitem, isFolder=False):
+    # type: (int, str, _ListItem, bool) -> bool
+
+    # pylint: disable=C0103
+    _record(handle, ("item", url, listitem, isFolder))
+    return True
+
+
+def _set_resolved_url(handle, succeeded, listitem):
+    # type: (int, bool, _ListItem) -> None
+
+    _record(handle, ("resolved", succeeded, listitem))
+
+
+def _end_of_directory(handle, succeeded=True, **kwargs):
+    # type: (int, bool, **Any) -> None
+
+    # pylint: disable=W0613
+
+    _record(handle, ("end", succeeded))
+
+
+SETTINGS = dict(DEFAULT_SETTINGS)
+ADDON_PATH = ""
+PROFILE_PATH = ""
+LOG_LEVEL = 3  # LOGWARNING
+
+
+def install(settings=None, addon_path=".", profile_path=None, log_level=3):
+    # type: (Optional[Dict[str, str]], str, Optional[str], int) -> None
+
+    global ADDON_PATH, PROFILE_PATH, LOG_LEVEL  # pylint: disable=W0603
+
+    SETTINGS.update(settings or {})
+    ADDON_PATH = addon_path
+    PROFILE_PATH = profile_path or tempfile.mkdtemp(prefix="allocine-")
+    LOG_LEVEL = log_level
+
+    xbmc = types.ModuleType("xbmc")
+    for level, name in enumerate(
+        ["LOGDEBUG", "LOGINFO", "LOGNOTICE", "LOGWARNING", "LOGERROR"]
+    ):
+        setattr(xbmc, name, level)
+    xbmc.log = _log  # type: ignore
+    xbmc.translatePath = lambda path: path  # type: ignore
+
+    xbmcaddon = types.ModuleType("xbmcaddon")
+    xbmcaddon.Addon = _Addon  # type: ignore
+
+    xbmcgui = types.ModuleType("xbmcgui")
+    xbmcgui.Dialog = _Dialog  # type: ignore
+    xbmcgui.ListItem = _ListItem  # type: ignore
+
+    xbmcplugin = types.ModuleType("xbmcplugin")
+    xbmcplugin.addDirectoryItem = _add_directory_item  # type: ignore
+    xbmcplugin.setResolvedUrl = _set_resolved_url  # type: ignore
+    xbmcplugin.endOfDirectory = _end_of_directory  # type: ignore
+
+    sys.modules["xbmc"] = xbmc
+    sys.modules["xbmcaddon"] = xbmcaddon
+    sys.modules["xbmcgui"] = xbmcgui
+    sys.modules["xbmcplugin"] = xbmcplugin
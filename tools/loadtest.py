@@ -0,0 +1,541 @@
+# coding: utf-8
+# Copyright © 2020 melmorabity
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+# Load test of concurrent scraper invocations. N workers run find and
+# getdetails invocations through AlloCineAddon.run(), with stubbed Kodi
+# modules, against a local fake upstream enforcing a rate limit. For each
+# concurrency level, report throughput, latency percentiles, failed
+# invocations, upstream requests, 429 responses and, with --cache, time spent
+# waiting for the SQLite write lock of the shared cache and cache save times.
+#
+# By default, workers are threads sharing one interpreter, so that imports
+# stay warm, as when Kodi reuses the language invoker (reuselanguageinvoker).
+# With --processes, each invocation runs in a new interpreter and pays import
+# and cache opening costs, as when the invoker is not reused.
+#
+# Usage: python tools/loadtest.py [--concurrency 1,2,4,8] [--requests N]
+#            [--rate-limit R] [--latency S] [--cache] [--processes] ...
+
+import argparse
+import itertools
+import json
+import math
+import os
+import shutil
+import subprocess  # nosec
+import sys
+import tempfile
+import threading
+import time
+import traceback
+
+try:
+    from queue import Empty
+    from queue import Queue
+except ImportError:
+    from Queue import Empty  # type: ignore
+    from Queue import Queue  # type: ignore
+
+try:
+    from typing import Any
+    from typing import Callable
+    from typing import Dict
+    from typing import List
+    from typing import Tuple
+
+    Task = Tuple[str, str]
+    # Invocation result, and samples not recorded in this process
+    Invoke = Callable[[int, str], Tuple[bool, Dict[str, Any]]]
+except ImportError:
+    pass
+
+try:
+    from urllib.parse import urlencode
+except ImportError:
+    from urllib import urlencode
+
+TOOLS_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(TOOLS_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, TOOLS_DIR)
+
+# pylint: disable=C0413
+import kodistubs  # noqa: E402
+from fakeupstream import FakeUpstream  # noqa: E402
+from fakeupstream import patch_api  # noqa: E402
+
+ACTIONS = ["find", "getdetails"]
+
+
+class Stats:
+    def __init__(self):
+        # type: () -> None
+
+        self._lock = threading.Lock()
+        self.latencies = {}  # type: Dict[str, List[float]]
+        self.lock_waits = {}  # type: Dict[str, List[float]]
+        self.saves = []  # type: List[float]
+        self.failed = 0
+
+    def reset(self):
+        # type: () -> None
+
+        with self._lock:
+            self.latencies = {}
+            self.lock_waits = {}
+            self.saves = []
+            self.failed = 0
+
+    def add_latency(self, action, latency, succeeded):
+        # type: (str, float, bool) -> None
+
+        with self._lock:
+            self.latencies.setdefault(action, []).append(latency)
+            if not succeeded:
+                self.failed += 1
+
+    def add_lock_wait(self, name, wait):
+        # type: (str, float) -> None
+
+        with self._lock:
+            self.lock_waits.setdefault(name, []).append(wait)
+
+    def add_save(self, duration):
+        # type: (float) -> None
+
+        with self._lock:
+            self.saves.append(duration)
+
+    def samples(self):
+        # type: () -> Dict[str, Any]
+
+        with self._lock:
+            return {"lock_waits": self.lock_waits, "saves": self.saves}
+
+    def add_samples(self, samples):
+        # type: (Dict[str, Any]) -> None
+
+        for name, waits in samples.get("lock_waits", {}).items():
+            for wait in waits:
+                self.add_lock_wait(name, wait)
+        for duration in samples.get("saves", []):
+            self.add_save(duration)
+
+
+def _instrument_cache(stats):
+    # type: (Stats) -> None
+
+    # pylint: disable=C0415
+    from resources.lib import cache
+
+    begin_write = cache.begin_write
+    save = cache.ResponseCache.save
+
+    def timed_begin_write(connection):
+        # type: (Any) -> None
+
+        # Waiting for the write lock held by concurrent invocations
+        start = time.time()
+        try:
+            begin_write(connection)
+        finally:
+            stats.add_lock_wait("SQLite write lock", time.time() - start)
+
+    def timed_save(self):
+        # type: (Any) -> None
+
+        start = time.time()
+        try:
+            save(self)
+        finally:
+            stats.add_save(time.time() - start)
+
+    cache.begin_write = timed_begin_write
+    cache.ResponseCache.save = timed_save
+
+
+def _setup(args, profile_path, upstream_url, stats):
+    # type: (argparse.Namespace, str, str, Stats) -> None
+
+    kodistubs.install(
+        settings={"cache": "true" if args.cache else "false"},
+        addon_path=ROOT_DIR,
+        profile_path=profile_path,
+        log_level=0 if args.verbose else 5,
+    )
+
+    # pylint: disable=C0415,W0212
+    from resources.lib.api import AlloCine
+
+    if args.backoff_factor is not None:
+        AlloCine._REQUESTS_BACKOFF_FACTOR = args.backoff_factor
+    patch_api(AlloCine, upstream_url)
+
+    _instrument_cache(stats)
+
+
+def _invoke_locally(handle, params):
+    # type: (int, str) -> Tuple[bool, Dict[str, Any]]
+
+    # pylint: disable=C0415
+    from resources.lib.scraper import AlloCineAddon
+
+    # Samples are recorded directly by the instrumented cache
+    try:
+        AlloCineAddon(handle, params).run()
+    except Exception:  # pylint: disable=W0703
+        traceback.print_exc()
+        return False, {}
+
+    result = kodistubs.DIRECTORIES.get(handle, [("end", False)])[-1]
+    return result == ("end", True), {}
+
+
+def _process_invoker(args, profile_path, upstream_url):
+    # type: (argparse.Namespace, str, str) -> Invoke
+
+    command = [
+        sys.executable,
+        os.path.abspath(__file__),
+        "--upstream-url",
+        upstream_url,
+        "--profile-path",
+        profile_path,
+    ]
+    if args.cache:
+        command.append("--cache")
+    if args.verbose:
+        command.append("--verbose")
+    if args.backoff_factor is not None:
+        command.extend(["--backoff-factor", str(args.backoff_factor)])
+
+    def invoke(handle, params):
+        # type: (int, str) -> Tuple[bool, Dict[str, Any]]
+
+        try:
+            output = subprocess.check_output(  # nosec
+                command + ["--child", "{}:{}".format(handle, params)]
+            )
+            result = json.loads(output.decode("utf-8"))
+        except (subprocess.CalledProcessError, ValueError):
+            return False, {}
+
+        return result["succeeded"], result["samples"]
+
+    return invoke
+
+
+def _child(args):
+    # type: (argparse.Namespace) -> None
+
+    stats = Stats()
+    _setup(args, args.profile_path, args.upstream_url, stats)
+
+    handle, params = args.child.split(":", 1)
+    succeeded, _ = _invoke_locally(int(handle), params)
+    json.dump({"succeeded": succeeded, "samples": stats.samples()}, sys.stdout)
+
+
+def _percentile(values, percent):
+    # type: (List[float], float) -> float
+
+    if not values:
+        return 0.0
+    values = sorted(values)
+    # Nearest-rank method
+    index = max(int(math.ceil(percent / 100.0 * len(values))) - 1, 0)
+    return values[min(index, len(values) - 1)]
+
+
+def _tasks(args):
+    # type: (argparse.Namespace) -> List[Tuple[str, str]]
+
+    tasks = []
+    for i in range(args.requests):
+        action = args.actions[i % len(args.actions)]
+        # Limited key space, so that cached runs get hits
+        key = i % args.distinct
+        if action == "find":
+            params = {"action": "find", "title": "Movie {}".format(key)}
+        else:
+            params = {"action": "getdetails", "url": str(1000 + key)}
+        tasks.append((action, "?" + urlencode(params)))
+    return tasks
+
+
+def _worker(queue, handles, stats, invoke):
+    # type: (Queue, Any, Stats, Invoke) -> None
+
+    while True:
+        try:
+            action, params = queue.get_nowait()
+        except Empty:
+            return
+
+        handle = next(handles)
+        start = time.time()
+        try:
+            succeeded, samples = invoke(handle, params)
+        except Exception:  # pylint: disable=W0703
+            # Keep the worker running, so that concurrency does not drop
+            traceback.print_exc()
+            succeeded, samples = False, {}
+        latency = time.time() - start
+
+        stats.add_latency(action, latency, succeeded)
+        stats.add_samples(samples)
+
+
+def run_level(concurrency, tasks, upstream, stats, invoke):
+    # type: (int, List[Task], FakeUpstream, Stats, Invoke) -> Dict[str, Any]
+
+    stats.reset()
+    kodistubs.DIRECTORIES.clear()
+    upstream.reset_stats()
+
+    queue = Queue()  # type: Queue
+    for task in tasks:
+        queue.put(task)
+
+    handles = itertools.count(1)
+    threads = [
+        threading.Thread(
+            target=_worker, args=(queue, handles, stats, invoke)
+        )
+        for _ in range(concurrency)
+    ]
+
+    start = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    duration = time.time() - start
+
+    return {
+        "concurrency": concurrency,
+        "duration": duration,
+        "throughput": len(tasks) / duration,
+        "latencies": stats.latencies,
+        "failed": stats.failed,
+        "requests": upstream.requests,
+        "throttled": upstream.throttled,
+        "lock_waits": stats.lock_waits,
+        "saves": stats.saves,
+    }
+
+
+def _print_report(results, actions, processes):
+    # type: (List[Dict[str, Any]], List[str], bool) -> None
+
+    if processes:
+        print(
+            "Model: processes, one interpreter per invocation "
+            "(Kodi without language invoker reuse)"
+        )
+    else:
+        print(
+            "Model: threads, one interpreter shared by all invocations "
+            "(Kodi with language invoker reuse)"
+        )
+
+    header = "{:>5} {:>8} {:>6}".format("conc", "inv/s", "scale")
+    for action in actions:
+        header += " {:>26}".format(action + " p50/p95/p99 ms")
+    header += " {:>6} {:>7} {:>6} {:>20} {:>16}".format(
+        "failed", "upstrm", "429", "write lock tot/max", "save p95/max ms"
+    )
+    print(header)
+
+    base = results[0]["throughput"] / results[0]["concurrency"]
+    for result in results:
+        line = "{:>5} {:>8.1f} {:>6.2f}".format(
+            result["concurrency"],
+            result["throughput"],
+            # Throughput relative to linear scaling from the first level
+            result["throughput"] / (base * result["concurrency"]),
+        )
+        for action in actions:
+            latencies = result["latencies"].get(action, [])
+            line += " {:>26}".format(
+                "/".join(
+                    "{:.0f}".format(_percentile(latencies, p) * 1000)
+                    for p in (50, 95, 99)
+                )
+            )
+        waits = list(itertools.chain(*result["lock_waits"].values()))
+        saves = result["saves"]
+        line += " {:>6} {:>7} {:>6} {:>20} {:>16}".format(
+            result["failed"],
+            result["requests"],
+            result["throttled"],
+            "{:.1f}/{:.1f} ms".format(
+                sum(waits) * 1000, max(waits or [0]) * 1000
+            ),
+            "{:.0f}/{:.0f}".format(
+                _percentile(saves, 95) * 1000, max(saves or [0]) * 1000
+            ),
+        )
+        print(line)
+
+    lock_names = sorted(
+        set(itertools.chain(*(r["lock_waits"] for r in results)))
+    )
+    for name in lock_names:
+        print(
+            "lock {!r}: p99 wait by level (ms): {}".format(
+                name,
+                ", ".join(
+                    "{}: {:.2f}".format(
+                        r["concurrency"],
+                        _percentile(r["lock_waits"].get(name, []), 99)
+                        * 1000,
+                    )
+                    for r in results
+                ),
+            )
+        )
+
+
+def _parse_args():
+    # type: () -> argparse.Namespace
+
+    parser = argparse.ArgumentParser(
+        description="Load test concurrent scraper invocations"
+    )
+    parser.add_argument(
+        "--concurrency",
+        default="1,2,4,8,16",
+        help="comma-separated worker counts (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--requests",
+        type=int,
+        default=100,
+        help="invocations per concurrency level (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--actions",
+        default=",".join(ACTIONS),
+        help="comma-separated actions to mix (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--distinct",
+        type=int,
+        default=50,
+        help="distinct titles and movie IDs (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--latency",
+        type=float,
+        default=0.02,
+        help="upstream response time in seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=50,
+        help="upstream requests per second, 0 to disable "
+        "(default: %(default)s)",
+    )
+    parser.add_argument(
+        "--burst",
+        type=int,
+        default=10,
+        help="upstream rate limit burst (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--retry-after",
+        type=int,
+        default=1,
+        help="Retry-After of 429 responses in seconds (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--backoff-factor",
+        type=float,
+        help="override the scraper retry backoff factor",
+    )
+    parser.add_argument(
+        "--cache",
+        action="store_true",
+        help="enable the scraper cache, shared by all workers",
+    )
+    parser.add_argument(
+        "--processes",
+        action="store_true",
+        help="run each invocation in a new interpreter, as when Kodi does "
+        "not reuse the language invoker",
+    )
+    parser.add_argument("--verbose", action="store_true")
+    # Invocation run by a worker, with --processes
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--upstream-url", help=argparse.SUPPRESS)
+    parser.add_argument("--profile-path", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    args.concurrency = [int(c) for c in args.concurrency.split(",")]
+    args.actions = args.actions.split(",")
+    for action in args.actions:
+        if action not in ACTIONS:
+            parser.error("unknown action: {}".format(action))
+
+    return args
+
+
+def main():
+    # type: () -> None
+
+    args = _parse_args()
+    if args.child:
+        _child(args)
+        return
+
+    upstream = FakeUpstream(
+        latency=args.latency,
+        rate_limit=args.rate_limit,
+        burst=args.burst,
+        retry_after=args.retry_after,
+    )
+
+    profile_path = tempfile.mkdtemp(prefix="allocine-loadtest-")
+    stats = Stats()
+    if args.processes:
+        invoke = _process_invoker(args, profile_path, upstream.url)
+    else:
+        _setup(args, profile_path, upstream.url, stats)
+        invoke = _invoke_locally
+
+    tasks = _tasks(args)
+    results = []  # type: List[Dict[str, Any]]
+    try:
+        with upstream:
+            for concurrency in args.concurrency:
+                # Each level starts cold
+                cache_path = os.path.join(profile_path, "cache.sqlite")
+                if os.path.exists(cache_path):
+                    os.remove(cache_path)
+                results.append(
+                    run_level(concurrency, tasks, upstream, stats, invoke)
+                )
+    finally:
+        shutil.rmtree(profile_path)
+
+    _print_report(results, args.actions, args.processes)
+
+
+if __name__ == "__main__":
+    main()
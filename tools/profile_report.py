@@ -0,0 +1,108 @@
+# coding: utf-8
+# Copyright © 2020 melmorabity
+
+# This program is free software; you can redistribute it and/or modify it under
+# the terms of the GNU General Public License as published by the Free Software
+# Foundation; either version 2 of the License, or (at your option) any later
+# version.
+#
+# This program is distributed in the hope that it will be useful, but WITHOUT
+# ANY WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS
+# FOR A PARTICULAR PURPOSE. See the GNU General Public License for more
+# details.
+#
+# You should have received a copy of the GNU General Public License along with
+# this program; if not, write to the Free Software Foundation, Inc., 51
+# Franklin Street, Fifth Floor, Boston, MA 02110-1301, USA.
+
+# Aggregate the pstats files dumped by profiled scraper invocations (see the
+# "Debugging" add-on settings) into a report of the hottest functions across
+# a whole scan.
+#
+# Usage: python tools/profile_report.py [--top N] [--sort KEY]
+#            [--action ACTION] PATH...
+
+import argparse
+from collections import Counter
+import os
+import pstats
+import sys
+
+try:
+    from typing import List
+except ImportError:
+    pass
+
+
+PROFILE_FILE_EXTENSION = ".pstats"
+SORT_KEYS = ["cumulative", "tottime", "ncalls"]
+
+
+def _action(file_name):
+    # type: (str) -> str
+
+    # <date>-<time>-<pid>-<action>-<movie ID>.pstats
+    parts = os.path.basename(file_name).split("-")
+    return parts[3] if len(parts) > 4 else "unknown"
+
+
+def find_profiles(paths, action=None):
+    # type: (List[str], str) -> List[str]
+
+    files = []  # type: List[str]
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(
+                os.path.join(path, f)
+                for f in sorted(os.listdir(path))
+                if f.endswith(PROFILE_FILE_EXTENSION)
+            )
+        else:
+            files.append(path)
+
+    if action:
+        files = [f for f in files if _action(f) == action]
+
+    return files
+
+
+def main():
+    # type: () -> None
+
+    parser = argparse.ArgumentParser(
+        description="Aggregate scraper profiles into a hot function report"
+    )
+    parser.add_argument("--top", type=int, default=30)
+    parser.add_argument("--sort", choices=SORT_KEYS, default=SORT_KEYS[0])
+    parser.add_argument("--action", help="only keep profiles of this action")
+    parser.add_argument(
+        "paths", nargs="+", metavar="PATH", help="pstats file or directory"
+    )
+    args = parser.parse_args()
+
+    files = find_profiles(args.paths, args.action)
+    if not files:
+        parser.error("no profile found")
+
+    actions = Counter(_action(f) for f in files)
+    print(
+        "{} profiles: {}".format(
+            len(files),
+            ", ".join(
+                "{} {}".format(count, action)
+                for action, count in sorted(actions.items())
+            ),
+        )
+    )
+
+    stats = pstats.Stats(files[0], stream=sys.stdout)
+    for file_name in files[1:]:
+        stats.add(file_name)
+    # Do not list every aggregated file in the report header
+    stats.files = []
+
+    stats.sort_stats(args.sort).print_stats(args.top)
+
+
+if __name__ == "__main__":
+    main()